@@ -1,3 +1,4 @@
+import sys
 import queue
 import threading
 import sounddevice as sd
@@ -6,8 +7,10 @@ import webrtcvad
 from scipy import signal
 import os
 from dotenv import load_dotenv
+from debug_log import get_logger
 
 load_dotenv()
+log = get_logger("audio")
 
 class AudioRecorder:
     def __init__(self):
@@ -20,6 +23,11 @@ class AudioRecorder:
         self.silence_threshold = float(os.getenv('SILENCE_THRESHOLD'))
         self.min_speech_duration = float(os.getenv('MIN_SPEECH_DURATION'))
         self.silence_duration = float(os.getenv('SILENCE_DURATION'))
+        # Pause after which a speculative turn is started, see record_until_silence
+        self.speculation_pause = float(os.getenv('SPECULATION_PAUSE', '0.3'))
+        # The per frame speech/silence indicators are console feedback written straight to
+        # stdout, not log records, so LOG_LEVEL, LOG_COMPONENTS and LOG_SINK do not apply to them
+        self.show_activity = os.getenv('VAD_INDICATORS', os.getenv('DEBUG_MODE', 'false')).lower() == 'true'
         print(f"AudioRecorder initialized with settings:")
         print(f"Sample rate: {self.sample_rate}")
         print(f"VAD frame duration: {self.frame_duration}")
@@ -34,27 +42,39 @@ class AudioRecorder:
         if len(indata.shape) > 1 and indata.shape[1] > 1:
             indata = np.mean(indata, axis=1, keepdims=True)
         self.buffer.put(indata.copy())
-        # Print audio levels for debugging
-        audio_level = np.abs(indata).mean()
-        #if audio_level > 0.01:  # Only print if there's significant audio
-            #print(f"Audio level: {audio_level:.4f}")
 
     def is_speech(self, audio_frame):
         try:
             is_speech_frame = self.vad.is_speech(audio_frame.tobytes(), self.sample_rate)
-            if is_speech_frame:
-                print("X", end="", flush=True)  # Visual indicator of speech
+            if is_speech_frame and self.show_activity:
+                sys.stdout.write("X")  # Visual indicator of speech
+                sys.stdout.flush()
             return is_speech_frame
         except Exception as e:
             print(f"Error in VAD processing: {e}")
             return False
 
-    def record_until_silence(self):
+    def _collect_audio(self):
+        # Ensure single channel output
+        audio_data = np.concatenate(self.audio_data)
+        if len(audio_data.shape) > 1:
+            audio_data = np.mean(audio_data, axis=1)
+        return audio_data
+
+    def record_until_silence(self, on_pause=None, on_resume=None):
+        """Record until SILENCE_DURATION of silence follows speech.
+
+        If on_pause is given it is called with the audio so far once a shorter
+        SPECULATION_PAUSE of silence is seen, and on_resume is called if speech
+        starts again before the full silence duration. Both are called from the
+        recording loop and must return quickly.
+        """
         print("\nListening...")
         self.recording = True
         self.audio_data = []
         silence_counter = 0
         speech_detected = False
+        speculating = False
         
         try:
             with sd.InputStream(callback=self.callback,
@@ -75,9 +95,20 @@ class AudioRecorder:
                         if is_speech_frame:
                             speech_detected = True
                             silence_counter = 0
+                            if speculating:
+                                speculating = False
+                                if on_resume:
+                                    on_resume()
                         elif speech_detected:
                             silence_counter += len(audio_chunk) / self.sample_rate
-                            print(".", end="", flush=True)  # Visual indicator of silence
+                            if self.show_activity:
+                                sys.stdout.write(".")  # Visual indicator of silence
+                                sys.stdout.flush()
+
+                            if (on_pause and not speculating
+                                    and self.speculation_pause <= silence_counter < self.silence_duration):
+                                speculating = True
+                                on_pause(self._collect_audio())
                             
                             if silence_counter >= self.silence_duration:
                                 print("\nSpeech complete.")
@@ -91,11 +122,7 @@ class AudioRecorder:
             return None
                 
         if self.audio_data:
-            # Ensure single channel output
-            audio_data = np.concatenate(self.audio_data)
-            if len(audio_data.shape) > 1:
-                audio_data = np.mean(audio_data, axis=1)
-            return audio_data
+            return self._collect_audio()
         else:
             return None
 
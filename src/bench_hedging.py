@@ -0,0 +1,108 @@
+"""Compare the tail latency of a single LLM backend with hedged requests.
+
+Starts two stub OpenAI compatible servers on localhost with injected latency and
+sends the same sequence of requests through the primary on its own and through
+a HedgedBackend over both.
+
+    python bench_hedging.py --requests 300 --slow-rate 0.03 --slow 1.5
+"""
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from llm_backends import LocalBackend, HedgedBackend, describe_latencies
+
+
+def start_stub(name, latency, fail_rate, rng):
+    """Start a stub chat completions server, returns (server, url)"""
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with lock:
+                delay = latency()
+                fail = rng.random() < fail_rate
+            time.sleep(delay)
+            if fail:
+                self.send_response(500)
+                self.end_headers()
+                return
+            body = json.dumps({
+                "choices": [{"message": {"role": "assistant", "content": f"Hello from {name}"}}]
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run(backend, count):
+    messages = [{"role": "user", "content": "Hello"}]
+    latencies, failures = [], 0
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            backend.complete(messages, None, timeout=10)
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            failures += 1
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--base", type=float, default=0.05, help="typical primary latency (s)")
+    parser.add_argument("--slow", type=float, default=1.5, help="latency of a slow primary request (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="fraction of slow primary requests")
+    parser.add_argument("--secondary", type=float, default=0.15, help="typical secondary latency (s)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of primary requests that fail")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    os.environ.setdefault('HEDGE_MIN_SAMPLES', '10')
+
+    def primary_latency():
+        if rng.random() < args.slow_rate:
+            return args.slow
+        return args.base * rng.uniform(0.8, 1.4)
+
+    def secondary_latency():
+        return args.secondary * rng.uniform(0.8, 1.4)
+
+    primary_server, primary_url = start_stub("primary", primary_latency, args.fail_rate, rng)
+    secondary_server, secondary_url = start_stub("secondary", secondary_latency, 0.0, rng)
+    try:
+        single, single_failures = run(LocalBackend(primary_url, "stub", 16, name="primary"), args.requests)
+        hedged_backend = HedgedBackend(
+            LocalBackend(primary_url, "stub", 16, name="primary"),
+            LocalBackend(secondary_url, "stub", 16, name="secondary")
+        )
+        hedged, hedged_failures = run(hedged_backend, args.requests)
+    finally:
+        primary_server.shutdown()
+        secondary_server.shutdown()
+
+    print(f"Primary only: {describe_latencies(single)}, {single_failures} failed")
+    print(f"Hedged:       {describe_latencies(hedged)}, {hedged_failures} failed")
+    stats = hedged_backend.stats
+    secondary_load = stats["hedged"] + stats["failovers"] + stats["circuit_open"]
+    print(f"Requests sent to the secondary: {secondary_load} ({secondary_load / args.requests:.1%})")
+    print(hedged_backend.report())
+
+
+if __name__ == "__main__":
+    main()
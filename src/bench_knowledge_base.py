@@ -0,0 +1,87 @@
+"""Benchmark the knowledge base index on a synthetic corpus.
+
+Generates a corpus of --passages passages with a Zipf distributed vocabulary,
+builds the index, times queries and an incremental re-index after editing a
+few files.
+
+    python bench_knowledge_base.py --passages 100000 --queries 1000
+"""
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from knowledge_base import KnowledgeBase
+
+
+def make_corpus(corpus_dir, passages, passages_per_file, words_per_passage, vocabulary, rng):
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    files = []
+    for index in range(0, passages, passages_per_file):
+        count = min(passages_per_file, passages - index)
+        ids = np.minimum(rng.zipf(1.2, size=(count, words_per_passage)) - 1, vocabulary - 1)
+        path = os.path.join(corpus_dir, f"doc_{index // passages_per_file:05d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n\n".join(" ".join(words[row]) for row in ids))
+        files.append(path)
+    return files, words
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--passages", type=int, default=100000)
+    parser.add_argument("--passages-per-file", type=int, default=100)
+    parser.add_argument("--words", type=int, default=80, help="words per passage")
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--edit-files", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = os.path.join(tmp, "corpus")
+        index_dir = os.path.join(tmp, "index")
+        os.makedirs(corpus_dir)
+
+        start = time.perf_counter()
+        files, words = make_corpus(corpus_dir, args.passages, args.passages_per_file,
+                                   args.words, args.vocabulary, rng)
+        print(f"Generated {args.passages} passages in {len(files)} files in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        kb = KnowledgeBase(corpus_dir, index_dir)
+        kb.refresh()
+        build = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(index_dir) for name in names)
+        print(f"Indexed {kb.total_docs} passages in {build:.1f}s, index size {size / 1e6:.1f} MB")
+
+        # Reopen so queries run against the memory-mapped index, as after a restart
+        start = time.perf_counter()
+        kb = KnowledgeBase(corpus_dir, index_dir)
+        print(f"Opened index in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        # Three word queries mixing common and rare words
+        queries = [" ".join(words[np.minimum(rng.zipf(1.5, size=3) * 10, args.vocabulary - 1)])
+                   for _ in range(args.queries)]
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            kb.search(query, 3)
+            latencies.append(time.perf_counter() - start)
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        print(f"Query latency over {len(queries)} queries: p50={p50:.2f}ms, p95={p95:.2f}ms, p99={p99:.2f}ms")
+
+        for path in files[:args.edit_files]:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n\nfreshly added passage about knowledge base benchmarks")
+        start = time.perf_counter()
+        indexed, _ = kb.refresh()
+        print(f"Re-indexed {indexed} edited files in {(time.perf_counter() - start) * 1000:.0f}ms")
+        results = kb.search("knowledge base benchmarks", 3)
+        print(f"Edited passages found after re-index: {len(results)}, top file {results[0][1] if results else None}")
+
+
+if __name__ == "__main__":
+    main()
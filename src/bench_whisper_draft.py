@@ -0,0 +1,88 @@
+"""Compare Whisper real-time factor with and without the draft model.
+
+Transcribes every clip in the clip directory with WHISPER_MODEL on its own and
+with WHISPER_DRAFT_MODEL assisting it, then reports the real-time factor
+(processing time / audio duration) of both and checks the transcripts match.
+
+    WHISPER_DRAFT_MODEL=openai/whisper-tiny python bench_whisper_draft.py --clips ../clips
+"""
+import os
+import time
+import argparse
+import numpy as np
+import soundfile as sf
+from scipy import signal
+from speech_to_text import SpeechToText
+
+
+def load_clip(path, sample_rate):
+    audio, clip_rate = sf.read(path, dtype="float32")
+    if len(audio.shape) > 1:
+        audio = np.mean(audio, axis=1)
+    if clip_rate != sample_rate:
+        audio = signal.resample_poly(audio, sample_rate, clip_rate).astype(np.float32)
+    return audio
+
+
+def timed_transcribe(stt, audio):
+    start = time.perf_counter()
+    text = stt.transcribe(audio)
+    return text, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", default=os.getenv('WHISPER_BENCH_CLIPS', os.path.join('..', 'clips')),
+                        help="directory of .wav/.flac clips")
+    args = parser.parse_args()
+
+    if not os.getenv('WHISPER_DRAFT_MODEL'):
+        parser.error("set WHISPER_DRAFT_MODEL to the draft model to compare against")
+
+    stt = SpeechToText()
+    if "assistant_model" not in stt.generate_kwargs:
+        parser.error("the draft model could not be used, see the message above")
+    assisted_kwargs = stt.generate_kwargs
+
+    sample_rate = stt.processor.feature_extractor.sampling_rate
+    clips = sorted(name for name in os.listdir(args.clips) if name.lower().endswith((".wav", ".flac")))
+    if not clips:
+        parser.error(f"no .wav or .flac clips found in {args.clips}")
+
+    # Warm up both paths so one-off initialisation is not counted
+    warmup = load_clip(os.path.join(args.clips, clips[0]), sample_rate)
+    for kwargs in ({}, assisted_kwargs):
+        stt.generate_kwargs = kwargs
+        stt.transcribe(warmup)
+
+    total_audio = total_main = total_assisted = 0.0
+    mismatches = 0
+    print(f"{'clip':30} {'audio':>7} {'RTF main':>9} {'RTF draft':>10} {'speedup':>8}")
+    for name in clips:
+        audio = load_clip(os.path.join(args.clips, name), sample_rate)
+        duration = len(audio) / sample_rate
+
+        stt.generate_kwargs = {}
+        main_text, main_time = timed_transcribe(stt, audio)
+        stt.generate_kwargs = assisted_kwargs
+        assisted_text, assisted_time = timed_transcribe(stt, audio)
+
+        total_audio += duration
+        total_main += main_time
+        total_assisted += assisted_time
+        match = main_text == assisted_text
+        mismatches += not match
+        print(f"{name[:30]:30} {duration:6.1f}s {main_time / duration:9.3f} {assisted_time / duration:10.3f} "
+              f"{main_time / assisted_time:7.2f}x{'' if match else '  transcript differs'}")
+        if not match:
+            print(f"  main:  {main_text}\n  draft: {assisted_text}")
+
+    print(f"\n{len(clips)} clips, {total_audio:.1f}s of audio on {stt.device}")
+    print(f"RTF {stt.model_id}: {total_main / total_audio:.3f}")
+    print(f"RTF with {stt.draft_model_id}: {total_assisted / total_audio:.3f} "
+          f"({total_main / total_assisted:.2f}x faster)")
+    print(f"Transcripts identical: {len(clips) - mismatches}/{len(clips)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ROOT_LOGGER = "assistant"
+_configure_lock = threading.Lock()
+_configured = False
+
+
+class Payload:
+    """Wrap a value to be logged so it is only serialised if the record is emitted.
+
+    Strings are logged as they are, anything else goes through json.dumps. Output
+    longer than LOG_MAX_PAYLOAD characters is truncated (0 disables truncation).
+    """
+
+    max_chars = int(os.getenv('LOG_MAX_PAYLOAD', '2000'))
+
+    def __init__(self, value, indent=2):
+        self.value = value
+        self.indent = indent
+
+    def __str__(self):
+        if isinstance(self.value, str):
+            text = self.value
+        else:
+            text = json.dumps(self.value, indent=self.indent, default=str)
+        if self.max_chars and len(text) > self.max_chars:
+            text = f"{text[:self.max_chars]}... [{len(text) - self.max_chars} more characters]"
+        return text
+
+
+class Lazy:
+    """Wrap a callable whose result is only computed if the log record is emitted"""
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+class _BufferedHandler(logging.handlers.MemoryHandler):
+    """MemoryHandler that renders the message when it is logged, not when the buffer is flushed"""
+
+    def emit(self, record):
+        # Arguments may be mutated after the call, so capture their state now
+        record.msg = record.getMessage()
+        record.args = None
+        super().emit(record)
+
+
+def _parse_level(name, default):
+    level = logging.getLevelName(name.strip().upper()) if name else default
+    return level if isinstance(level, int) else default
+
+
+def _make_sink():
+    log_file = os.getenv('LOG_FILE')
+    target = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler(sys.stdout)
+    target.setFormatter(logging.Formatter("[%(levelname)s %(asctime)s %(name)s] %(message)s", "%H:%M:%S"))
+
+    sink = os.getenv('LOG_SINK', 'direct').lower()
+    if sink == 'buffered':
+        # Records are written in batches, or straight away for errors
+        handler = _BufferedHandler(
+            int(os.getenv('LOG_BUFFER_SIZE', '200')),
+            flushLevel=logging.ERROR,
+            target=target
+        )
+        atexit.register(handler.flush)
+        return handler
+    if sink == 'async':
+        # Records are formatted on the calling thread and written on a background thread
+        records = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, target)
+        listener.start()
+        atexit.register(listener.stop)
+        return logging.handlers.QueueHandler(records)
+    return target
+
+
+def configure():
+    """Set up the shared logger from the environment, only the first call has any effect.
+
+    DEBUG_MODE=true enables debug output for every component, LOG_LEVEL sets the
+    level explicitly. LOG_COMPONENTS restricts output to some components, e.g.
+    "llm,web" or "llm:INFO,audio", other components only log warnings and errors.
+    LOG_SINK chooses between direct, buffered and async output.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+
+        debug_mode = os.getenv('DEBUG_MODE', 'false').lower() == 'true'
+        level = _parse_level(os.getenv('LOG_LEVEL'), logging.DEBUG if debug_mode else logging.WARNING)
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.propagate = False
+        root.addHandler(_make_sink())
+
+        components = [entry for entry in os.getenv('LOG_COMPONENTS', '').split(',') if entry.strip()]
+        if not components:
+            root.setLevel(level)
+            return
+
+        root.setLevel(logging.WARNING)
+        for entry in components:
+            name, _, component_level = entry.partition(':')
+            logging.getLogger(f"{ROOT_LOGGER}.{name.strip()}").setLevel(
+                _parse_level(component_level, logging.DEBUG)
+            )
+
+
+def get_logger(component):
+    """Get the logger for a component, e.g. get_logger("llm")"""
+    configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{component}")
@@ -0,0 +1,363 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import numpy as np
+from dotenv import load_dotenv
+from debug_log import get_logger
+
+load_dotenv()
+log = get_logger("kb")
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is",
+    "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "will", "with"
+}
+LEXICON_DTYPE = np.dtype([("hash", "<u8"), ("start", "<u8"), ("df", "<u4")])
+
+
+def tokenize(text):
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOP_WORDS]
+
+
+def term_hash(term):
+    """64 bit hash used as the lexicon key, collisions are negligible at this size"""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class Segment:
+    """One immutable part of the index, memory-mapped from disk.
+
+    Files in a segment directory:
+    - lexicon.npy: (hash, start, df) per term, sorted by hash
+    - docs.npy, tfs.npy: postings, grouped by term in lexicon start order
+    - doc_len.npy: token count of each passage
+    - text.bin, text_offsets.npy: passage text, UTF-8 encoded
+    - doc_source.npy, sources.json: the file each passage came from
+    - deleted.npy: passages of files that changed or were removed since
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.lexicon = np.load(os.path.join(path, "lexicon.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(path, "docs.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        self.doc_len = np.load(os.path.join(path, "doc_len.npy"), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+        self.doc_source = np.load(os.path.join(path, "doc_source.npy"), mmap_mode="r")
+        self.deleted = np.load(os.path.join(path, "deleted.npy"))
+        text_path = os.path.join(path, "text.bin")
+        self.text = np.memmap(text_path, dtype=np.uint8, mode="r") if os.path.getsize(text_path) else b""
+        with open(os.path.join(path, "sources.json"), "r", encoding="utf-8") as f:
+            self.sources = json.load(f)
+
+    @property
+    def size(self):
+        return len(self.doc_len)
+
+    def postings(self, hashes):
+        """Return {hash: (docs, tfs)} for the hashes present in this segment"""
+        found = {}
+        index = np.searchsorted(self.lexicon["hash"], hashes)
+        for h, i in zip(hashes, index):
+            if i < len(self.lexicon) and self.lexicon["hash"][i] == h:
+                start, df = int(self.lexicon["start"][i]), int(self.lexicon["df"][i])
+                found[int(h)] = (self.docs[start:start + df], self.tfs[start:start + df])
+        return found
+
+    def passage(self, doc):
+        start, end = int(self.text_offsets[doc]), int(self.text_offsets[doc + 1])
+        return bytes(self.text[start:end]).decode("utf-8")
+
+    def delete(self, first, count):
+        self.deleted[first:first + count] = True
+        np.save(os.path.join(self.path, "deleted.npy"), self.deleted)
+
+    @staticmethod
+    def build(path, documents):
+        """Write a segment for documents, a list of (source, passages) pairs.
+
+        Returns {source: (first_doc, passage_count)}.
+        """
+        vocabulary = {}
+        term_ids, doc_ids, tfs, doc_len, texts, doc_source, ranges = [], [], [], [], [], [], {}
+        for source_index, (source, passages) in enumerate(documents):
+            ranges[source] = (len(doc_len), len(passages))
+            for passage in passages:
+                tokens = tokenize(passage)
+                doc = len(doc_len)
+                for term, tf in Counter(tokens).items():
+                    term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                    doc_ids.append(doc)
+                    tfs.append(min(tf, 65535))
+                doc_len.append(len(tokens))
+                texts.append(passage.encode("utf-8"))
+                doc_source.append(source_index)
+
+        term_ids = np.array(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")  # Doc ids stay ascending within a term
+        df = np.bincount(term_ids, minlength=len(vocabulary))
+        starts = np.concatenate(([0], np.cumsum(df)[:-1])) if len(df) else np.zeros(0, dtype=np.int64)
+
+        lexicon = np.zeros(len(vocabulary), dtype=LEXICON_DTYPE)
+        lexicon["hash"] = [term_hash(term) for term in vocabulary]
+        lexicon["start"] = starts
+        lexicon["df"] = df
+        lexicon.sort(order="hash")
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "lexicon.npy"), lexicon)
+        np.save(os.path.join(path, "docs.npy"), np.array(doc_ids, dtype=np.uint32)[order])
+        np.save(os.path.join(path, "tfs.npy"), np.array(tfs, dtype=np.uint16)[order])
+        np.save(os.path.join(path, "doc_len.npy"), np.array(doc_len, dtype=np.uint32))
+        np.save(os.path.join(path, "text_offsets.npy"),
+                np.concatenate(([0], np.cumsum([len(text) for text in texts]))).astype(np.uint64))
+        np.save(os.path.join(path, "doc_source.npy"), np.array(doc_source, dtype=np.uint32))
+        np.save(os.path.join(path, "deleted.npy"), np.zeros(len(doc_len), dtype=bool))
+        with open(os.path.join(path, "text.bin"), "wb") as f:
+            for text in texts:
+                f.write(text)
+        with open(os.path.join(path, "sources.json"), "w", encoding="utf-8") as f:
+            json.dump([source for source, _ in documents], f)
+        return ranges
+
+
+class KnowledgeBase:
+    """BM25 search over a local document corpus using an on-disk inverted index.
+
+    Text and Markdown files under corpus_dir are split into passages and indexed
+    into segments under index_dir. refresh() only indexes files that were added
+    or changed since the last run, their old passages are marked deleted, and
+    the index is rebuilt into a single segment once too much of it is deleted.
+
+    search() can run concurrently with refresh(). New segments are built while
+    searches continue, and only the swap to them waits for searches in flight.
+    """
+
+    def __init__(self, corpus_dir, index_dir):
+        self.corpus_dir = os.path.abspath(corpus_dir)
+        self.index_dir = os.path.abspath(index_dir)
+        self.k1 = float(os.getenv('KB_BM25_K1', '1.2'))
+        self.b = float(os.getenv('KB_BM25_B', '0.75'))
+        self.passage_words = int(os.getenv('KB_PASSAGE_WORDS', '120'))
+        self.max_segments = int(os.getenv('KB_MAX_SEGMENTS', '8'))
+        self.max_deleted = float(os.getenv('KB_MAX_DELETED', '0.3'))
+
+        # Serialises refreshes, and tracks searches so segments are not swapped out under them
+        self.refresh_lock = threading.Lock()
+        self.state = threading.Condition()
+        self.readers = 0
+        self.swapping = False
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+        self.segments = []
+        self._open_segments()
+
+    def _manifest_path(self):
+        return os.path.join(self.index_dir, "manifest.json")
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"next_segment": 0, "segments": [], "files": {}}
+
+    def _save_manifest(self):
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _open_segments(self):
+        self.segments = [Segment(os.path.join(self.index_dir, name)) for name in self.manifest["segments"]]
+        self.total_docs = sum(segment.size for segment in self.segments)
+        total_len = sum(int(segment.doc_len.sum()) for segment in self.segments)
+        self.avg_doc_len = total_len / self.total_docs if self.total_docs else 0.0
+
+    def split_passages(self, text):
+        """Split a document into passages of up to passage_words words along paragraph breaks"""
+        passages, current = [], []
+        for paragraph in re.split(r"\n\s*\n", text):
+            words = paragraph.split()
+            while len(words) > self.passage_words:  # Paragraph too long on its own
+                if current:
+                    passages.append(" ".join(current))
+                    current = []
+                passages.append(" ".join(words[:self.passage_words]))
+                words = words[self.passage_words:]
+            if current and len(current) + len(words) > self.passage_words:
+                passages.append(" ".join(current))
+                current = []
+            current.extend(words)
+        if current:
+            passages.append(" ".join(current))
+        return passages
+
+    def _scan_corpus(self):
+        files = {}
+        for root, _, names in os.walk(self.corpus_dir):
+            for name in names:
+                if name.lower().endswith((".txt", ".md")):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    files[os.path.relpath(path, self.corpus_dir)] = [stat.st_mtime_ns, stat.st_size]
+        return files
+
+    def _read_documents(self, sources):
+        documents = []
+        for source in sources:
+            with open(os.path.join(self.corpus_dir, source), "r", encoding="utf-8", errors="ignore") as f:
+                documents.append((source, self.split_passages(f.read())))
+        return documents
+
+    def _write_segment(self, sources, files):
+        name = f"seg_{self.manifest['next_segment']}"
+        self.manifest["next_segment"] += 1
+        ranges = Segment.build(os.path.join(self.index_dir, name), self._read_documents(sources))
+        for source, (first, count) in ranges.items():
+            self.manifest["files"][source] = {
+                "stat": files[source], "segment": name, "first": first, "count": count
+            }
+        return name
+
+    @contextmanager
+    def _exclusive(self):
+        """Block new searches and wait for the ones in flight to finish"""
+        with self.state:
+            self.swapping = True
+            try:
+                self.state.wait_for(lambda: self.readers == 0)
+                yield
+            finally:
+                self.swapping = False
+                self.state.notify_all()
+
+    def refresh(self):
+        """Bring the index up to date with the corpus.
+
+        Returns (indexed, removed), the number of files (re)indexed and removed.
+        A compaction re-indexes every file.
+        """
+        with self.refresh_lock:
+            files = self._scan_corpus()
+            indexed = self.manifest["files"]
+            changed = sorted(source for source, stat in files.items()
+                             if source not in indexed or indexed[source]["stat"] != stat)
+            removed = [source for source in indexed if source not in files]
+            if not changed and not removed:
+                return 0, 0
+
+            # Tombstones are only written once searches are out of the way, see below
+            tombstones = [indexed.pop(source) for source in removed + [source for source in changed if source in indexed]]
+            deleted = (sum(int(segment.deleted.sum()) for segment in self.segments)
+                       + sum(entry["count"] for entry in tombstones))
+            if (len(self.segments) >= self.max_segments
+                    or (self.total_docs and deleted / self.total_docs > self.max_deleted)):
+                # Too fragmented, rebuild everything into a single segment
+                log.debug("Compacting knowledge base index")
+                old_segments = self.manifest["segments"]
+                self.manifest["files"] = {}
+                self.manifest["segments"] = [self._write_segment(sorted(files), files)]
+                changed = sorted(files)
+            else:
+                old_segments = [name for name in self.manifest["segments"]
+                                if not any(entry["segment"] == name for entry in indexed.values())]
+                self.manifest["segments"] = [name for name in self.manifest["segments"] if name not in old_segments]
+                if changed:
+                    self.manifest["segments"].append(self._write_segment(changed, files))
+
+            with self._exclusive():
+                segments = {segment.name: segment for segment in self.segments}
+                for entry in tombstones:
+                    if entry["segment"] not in old_segments:
+                        segments[entry["segment"]].delete(entry["first"], entry["count"])
+                self._save_manifest()
+                self.segments = []
+                for name in old_segments:
+                    shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+                self._open_segments()
+            log.debug("Indexed %d files, removed %d, %d passages in %d segments",
+                      len(changed), len(removed), self.total_docs, len(self.segments))
+            return len(changed), len(removed)
+
+    def start_watching(self, interval):
+        """Refresh the index every interval seconds on a background thread"""
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    indexed, removed = self.refresh()
+                    if indexed or removed:
+                        log.debug("Knowledge base updated, %d files re-indexed, %d removed", indexed, removed)
+                except Exception as e:
+                    log.warning("Error refreshing knowledge base: %s", e)
+
+        threading.Thread(target=watch, name="kb-refresh", daemon=True).start()
+
+    def search(self, query, num_results=3):
+        """Return the best matching passages as a list of (score, source, text)"""
+        with self.state:
+            self.state.wait_for(lambda: not self.swapping)
+            self.readers += 1
+        try:
+            return self._search(query, num_results)
+        finally:
+            with self.state:
+                self.readers -= 1
+                self.state.notify_all()
+
+    def _search(self, query, num_results):
+        terms = sorted(set(tokenize(query)))
+        if not terms or not self.total_docs:
+            return []
+        hashes = np.array([term_hash(term) for term in terms], dtype=np.uint64)
+        postings = [segment.postings(hashes) for segment in self.segments]
+
+        # Document frequencies are summed over all segments, including deleted passages
+        df = Counter()
+        for found in postings:
+            for h, (docs, _) in found.items():
+                df[h] += len(docs)
+        idf = {h: np.log(1 + (self.total_docs - n + 0.5) / (n + 0.5)) for h, n in df.items()}
+
+        candidates = []
+        for segment, found in zip(self.segments, postings):
+            if not found:
+                continue
+            docs = np.concatenate([docs for docs, _ in found.values()])
+            tfs = np.concatenate([tfs for _, tfs in found.values()]).astype(np.float32)
+            weights = np.concatenate([np.full(len(d), idf[h], dtype=np.float32) for h, (d, _) in found.items()])
+            norm = self.k1 * (1 - self.b + self.b * segment.doc_len[docs] / self.avg_doc_len)
+            scores = np.bincount(docs, weights=weights * tfs * (self.k1 + 1) / (tfs + norm), minlength=segment.size)
+            scores[segment.deleted] = 0
+            top = np.argpartition(scores, -num_results)[-num_results:] if segment.size > num_results else np.arange(segment.size)
+            candidates.extend((float(scores[doc]), segment, int(doc)) for doc in top if scores[doc] > 0)
+
+        candidates.sort(key=lambda candidate: -candidate[0])
+        return [
+            (score, segment.sources[int(segment.doc_source[doc])], segment.passage(doc))
+            for score, segment, doc in candidates[:num_results]
+        ]
+
+    def search_knowledge_base(self, query: str, num_results: int = 3) -> str:
+        """Search the local knowledge base, formatted for the LLM"""
+        try:
+            results = self.search(query, num_results)
+            if not results:
+                return "No matching documents found in the knowledge base."
+            return "\n---\n".join(
+                f"Source {i}:\nFile: {source}\nContent:\n{text}\n"
+                for i, (_, source, text) in enumerate(results, 1)
+            )
+        except Exception as e:
+            error_msg = f"Error searching knowledge base: {str(e)}"
+            log.debug(error_msg, exc_info=True)
+            return error_msg
@@ -0,0 +1,52 @@
+import time
+from contextlib import contextmanager
+
+class LatencyBudget:
+    """Time allowed for one turn, handed down so each stage knows how long it has left"""
+
+    def __init__(self, seconds, deadline=None, timings=None, overruns=None):
+        self.seconds = seconds
+        self.deadline = deadline if deadline is not None else time.monotonic() + seconds
+        # Shared with child budgets so the whole turn is recorded in one place
+        self.timings = timings if timings is not None else {}
+        self.overruns = overruns if overruns is not None else {}
+
+    def child(self, reserve):
+        """Budget that ends reserve seconds early, keeping time back for later stages"""
+        deadline = self.deadline - reserve
+        return LatencyBudget(
+            max(0.0, deadline - time.monotonic()),
+            deadline=deadline,
+            timings=self.timings,
+            overruns=self.overruns
+        )
+
+    def remaining(self):
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, cap=None, floor=0.5):
+        """Timeout for a blocking call, at most cap and never below floor so the call can still be tried.
+
+        Returns None (no timeout) for an unlimited budget without a cap.
+        """
+        remaining = self.remaining()
+        if cap is not None:
+            remaining = min(cap, remaining)
+        if remaining == float('inf'):
+            return None
+        return max(floor, remaining)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage and record how far it ran past the deadline, if at all"""
+        start = time.monotonic()
+        try:
+            yield self
+        finally:
+            end = time.monotonic()
+            self.timings[name] = self.timings.get(name, 0.0) + end - start
+            if end > self.deadline:
+                self.overruns[name] = self.overruns.get(name, 0.0) + end - max(start, self.deadline)
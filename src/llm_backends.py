@@ -0,0 +1,347 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+import requests
+from dotenv import load_dotenv
+from debug_log import get_logger, Lazy, Payload
+
+load_dotenv()
+log = get_logger("llm")
+
+
+class LLMError(Exception):
+    """Raised when a backend fails to produce a response"""
+
+
+def percentile(values, pct):
+    """Nearest rank percentile of a list of numbers, None if it is empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def describe_latencies(values):
+    """Format the p50, p95 and p99 of a list of latencies"""
+    if not values:
+        return "no data"
+    return ", ".join(f"p{pct}={percentile(values, pct):.2f}s" for pct in (50, 95, 99))
+
+
+class LocalBackend:
+    """LM Studio, or any other OpenAI compatible server, called over plain HTTP.
+
+    Messages use the shared format, responses are returned as a dict with
+    'content' and, if the model called a tool, 'function_call'.
+    """
+
+    def __init__(self, api_url, api_key, max_tokens, name="local"):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.max_tokens = max_tokens
+        self.name = name
+
+    def _convert_message(self, message):
+        # Function results are sent with the 'tool' role to the local server
+        if message["role"] == "function":
+            return {**message, "role": "tool"}
+        return message
+
+    def complete(self, messages, function_schemas=None, timeout=None):
+        request_data = {
+            "model": "local-model",
+            "messages": [self._convert_message(message) for message in messages],
+            "temperature": 0.7,
+            "max_tokens": self.max_tokens,
+            "stream": False,
+            "tools": [
+                {
+                    "type": "function",
+                    "function": schema
+                } for schema in function_schemas
+            ] if function_schemas else None,
+            "tool_choice": "auto" if function_schemas else "none"
+        }
+
+        log.debug("%s request data:\n%s", self.name, Payload(request_data))
+
+        response = requests.post(
+            f"{self.api_url}/chat/completions",
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.api_key}"
+            },
+            json=request_data,
+            timeout=timeout
+        )
+
+        if response.status_code != 200:
+            raise LLMError(f"{self.name} returned {response.status_code}: {response.text[:200]}")
+
+        response_data = response.json()
+        log.debug("%s response data:\n%s", self.name, Payload(response_data))
+
+        # Handle tool calls (function calls)
+        message = response_data['choices'][0]['message']
+        if message.get('tool_calls'):  # Convert tool_calls to function_call format
+            tool_call = message['tool_calls'][0]
+            message['function_call'] = {
+                'name': tool_call['function']['name'],
+                'arguments': tool_call['function']['arguments']
+            }
+
+        return message
+
+
+class OpenAIBackend:
+    """OpenAI chat completions, responses are converted to the same dict format as LocalBackend"""
+
+    def __init__(self, api_key, model, max_tokens, base_url=None, name="openai"):
+        from openai import OpenAI  # Only imported when the OpenAI backend is used
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.model = model
+        self.max_tokens = max_tokens
+        self.name = name
+
+    def complete(self, messages, function_schemas=None, timeout=None):
+        kwargs = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": self.max_tokens,
+            "timeout": timeout
+        }
+        if function_schemas:
+            kwargs.update({
+                "functions": function_schemas,
+                "function_call": "auto"
+            })
+        message = self.client.chat.completions.create(**kwargs).choices[0].message
+
+        result = {"role": "assistant", "content": message.content}
+        if message.function_call is not None:
+            result["function_call"] = {
+                "name": message.function_call.name,
+                "arguments": message.function_call.arguments
+            }
+        return result
+
+
+class CircuitBreaker:
+    """Stops sending requests to a backend after repeated failures, then lets a single trial through after a while.
+
+    allow() should only be called right before a request is sent, a half open
+    breaker hands its one trial to the first caller.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            # Half open, let one trial through and keep the rest out until it succeeds or fails
+            if self.trial or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial = False
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    log.debug("Circuit breaker opened after %d failures", self.failures)
+                self.opened_at = time.monotonic()
+
+
+class HedgedBackend:
+    """Send each request to a primary backend and hedge it with a secondary one.
+
+    If the primary has not answered within the HEDGE_PERCENTILE latency of its
+    recent requests, the same request is sent to the secondary and the first
+    success wins. A failed primary fails over to the secondary straight away,
+    and backends that keep failing are skipped by their circuit breaker.
+
+    Requests that are already sent cannot be cancelled, so each one runs on its
+    own thread and a losing request keeps running until it finishes or times
+    out. A backend with HEDGE_MAX_IN_FLIGHT requests still running is skipped
+    rather than queued behind them.
+    """
+
+    def __init__(self, primary, secondary):
+        self.primary = primary
+        self.secondary = secondary
+        self.name = f"hedged({primary.name}, {secondary.name})"
+
+        self.hedge_percentile = float(os.getenv('HEDGE_PERCENTILE', '95'))
+        # Delay used until enough primary latencies have been seen
+        self.default_delay = float(os.getenv('HEDGE_DELAY', '2.0'))
+        self.min_delay = float(os.getenv('HEDGE_MIN_DELAY', '0.2'))
+        self.min_samples = int(os.getenv('HEDGE_MIN_SAMPLES', '10'))
+        failure_threshold = int(os.getenv('CIRCUIT_FAILURES', '3'))
+        reset_timeout = float(os.getenv('CIRCUIT_RESET', '30'))
+        max_in_flight = int(os.getenv('HEDGE_MAX_IN_FLIGHT', '3'))
+
+        self.breakers = {
+            primary: CircuitBreaker(failure_threshold, reset_timeout),
+            secondary: CircuitBreaker(failure_threshold, reset_timeout),
+        }
+        self.slots = {
+            primary: threading.BoundedSemaphore(max_in_flight),
+            secondary: threading.BoundedSemaphore(max_in_flight),
+        }
+        self.primary_latencies = deque(maxlen=int(os.getenv('HEDGE_WINDOW', '100')))
+        self.latencies = deque(maxlen=1000)
+        self.stats = {
+            "requests": 0,
+            "hedged": 0,
+            "failovers": 0,
+            "circuit_open": 0,
+            "secondary_wins": 0,
+            "busy": 0,
+            "failures": 0,
+        }
+
+    def hedge_delay(self):
+        """How long to wait for the primary before sending the hedged request"""
+        if len(self.primary_latencies) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, percentile(list(self.primary_latencies), self.hedge_percentile))
+
+    def _call(self, backend, messages, function_schemas, timeout):
+        start = time.monotonic()
+        try:
+            result = backend.complete(messages, function_schemas, timeout)
+        except Exception:
+            self.breakers[backend].record_failure()
+            raise
+        self.breakers[backend].record_success()
+        # Losing primary requests are recorded too, otherwise slow requests would never count
+        if backend is self.primary:
+            self.primary_latencies.append(time.monotonic() - start)
+        return result
+
+    def _run(self, future, backend, messages, function_schemas, timeout):
+        try:
+            result, error = self._call(backend, messages, function_schemas, timeout), None
+        except Exception as e:
+            result, error = None, e
+        # Free the slot before the caller can see the result and send its next request
+        self.slots[backend].release()
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def _submit(self, futures, backend, messages, function_schemas, deadline):
+        """Start a request on its own thread, None if the backend has too many requests in flight"""
+        if not self.slots[backend].acquire(blocking=False):
+            self.stats["busy"] += 1
+            log.debug("%s has too many requests in flight, skipping it", backend.name)
+            return None
+        timeout = None if deadline is None else max(0.1, deadline - time.monotonic())
+        future = Future()
+        future.set_running_or_notify_cancel()
+        threading.Thread(
+            target=self._run,
+            args=(future, backend, messages, function_schemas, timeout),
+            name=f"llm-{backend.name}",
+            daemon=True
+        ).start()
+        futures[future] = backend
+        return future
+
+    def complete(self, messages, function_schemas=None, timeout=None):
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        self.stats["requests"] += 1
+
+        # The secondary's breaker is only asked when a request is about to be sent to it
+        first, second = self.primary, self.secondary
+        if not self.breakers[self.primary].allow():
+            if self.breakers[self.secondary].allow():
+                log.debug("%s circuit open, using %s", self.primary.name, self.secondary.name)
+                self.stats["circuit_open"] += 1
+                first = self.secondary
+            # With both circuits open the primary is tried anyway, on its own
+            second = None
+
+        futures = {}
+        future = self._submit(futures, first, messages, function_schemas, deadline)
+        if future is None and second is not None and self.breakers[second].allow():
+            # The first backend is still busy with earlier requests that lost or stalled
+            future = self._submit(futures, second, messages, function_schemas, deadline)
+            if future is not None:
+                self.stats["failovers"] += 1
+            second = None
+        pending = {future} if future is not None else set()
+        delay = self.hedge_delay()
+        errors = []
+
+        while pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            wait_for = remaining
+            if second is not None:
+                hedge_in = max(0.0, start + delay - time.monotonic())
+                wait_for = hedge_in if remaining is None else min(hedge_in, remaining)
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    log.debug("%s failed: %s", futures[future].name, e)
+                    errors.append(e)
+                    continue
+                # First success wins, requests still running finish in the background and are ignored
+                if futures[future] is self.secondary:
+                    self.stats["secondary_wins"] += 1
+                self.latencies.append(time.monotonic() - start)
+                log.debug("%s answered in %.2fs", futures[future].name, time.monotonic() - start)
+                return result
+
+            if second is not None and (errors or time.monotonic() >= start + delay):
+                # Hedge after the delay, or fail over at once if the first backend failed
+                if self.breakers[second].allow():
+                    future = self._submit(futures, second, messages, function_schemas, deadline)
+                    if future is not None:
+                        self.stats["failovers" if errors else "hedged"] += 1
+                        log.debug("%s %s after %.2fs", "Failing over to" if errors else "Hedging with",
+                                  second.name, time.monotonic() - start)
+                        pending.add(future)
+                second = None
+            elif not done and remaining is not None and remaining <= 0:
+                break
+
+        self.stats["failures"] += 1
+        log.debug("%s", Lazy(self.report))
+        raise LLMError(f"No backend answered: {errors or ('timed out' if futures else 'all backends busy')}")
+
+    def report(self):
+        """Summarise hedging and compare tail latency with the primary on its own"""
+        return (
+            f"Hedged LLM: {self.stats['requests']} requests, {self.stats['hedged']} hedged, "
+            f"{self.stats['failovers']} failovers, {self.stats['circuit_open']} sent to "
+            f"{self.secondary.name} with the {self.primary.name} circuit open, {self.stats['secondary_wins']} won by "
+            f"{self.secondary.name}, {self.stats['busy']} skipped a busy backend, "
+            f"{self.stats['failures']} failed. "
+            f"Latency {describe_latencies(list(self.latencies))}, "
+            f"{self.primary.name} alone {describe_latencies(list(self.primary_latencies))}"
+        )
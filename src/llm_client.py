@@ -1,40 +1,50 @@
 import os
 from collections import deque
-import requests
-from openai import OpenAI
 from dotenv import load_dotenv
 from web_tools import WebTools
+from llm_backends import LocalBackend, OpenAIBackend, HedgedBackend
+from tool_prefetch import ToolPrefetcher
+from latency_budget import LatencyBudget
 import json
-import traceback
+from debug_log import get_logger, Lazy, Payload
 
 load_dotenv()
+log = get_logger("llm")
 
 class LLMClient:
     def __init__(self, max_history=10):
         self.provider = os.getenv('LLM_PROVIDER', 'local').lower()
         self.max_tokens = int(os.getenv('MAX_TOKENS', '500'))
-        self.debug = os.getenv('DEBUG_MODE', 'false').lower() == 'true'
+        # Longest a single request may take, a turn budget can shorten it further
+        self.request_timeout = float(os.getenv('LLM_TIMEOUT', '30'))
+        # Time kept back from the tool call so the final answer can still be generated
+        self.final_reserve = float(os.getenv('LLM_FINAL_RESERVE', '4'))
         
-        if self.provider == 'openai':
-            self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-            self.model = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
-        else:  # local
-            self.api_url = os.getenv('LM_STUDIO_API_URL')
-            self.api_key = os.getenv('LM_STUDIO_API_KEY')
+        # 'hedged' keeps two backends and races them, see HedgedBackend
+        if self.provider == 'hedged':
+            self.backend = HedgedBackend(
+                self._create_backend(os.getenv('LLM_HEDGE_PRIMARY', 'local').lower()),
+                self._create_backend(os.getenv('LLM_HEDGE_SECONDARY', 'openai').lower())
+            )
+        else:
+            self.backend = self._create_backend(self.provider)
             
         self.conversation_history = deque(maxlen=max_history)
         self.system_prompt = self._load_system_prompt()
         
-        print(f"Using LLM provider: {self.provider}")
+        print(f"Using LLM provider: {self.backend.name}")
         print(f"Max tokens: {self.max_tokens}")
         
         self.web_tools = WebTools()
+        self.prefetcher = ToolPrefetcher(self.web_tools)
         
         # Define available functions
         self.available_functions = {
             "search_web": self.web_tools.search_web,
             "get_sa_time": self.web_tools.get_sa_time
         }
+        # Functions that accept a budget argument and can cut their work short
+        self.budgeted_functions = {"search_web"}
         
         # Define function schemas
         self.function_schemas = [
@@ -66,9 +76,55 @@ class LLMClient:
             }
         ]
 
-    def debug_print(self, *args, **kwargs):
-        if self.debug:
-            print(*args, **kwargs)
+        # Local document search, only offered when a corpus is configured
+        corpus_dir = os.getenv('KNOWLEDGE_BASE_DIR')
+        if corpus_dir:
+            from knowledge_base import KnowledgeBase
+            index_dir = os.getenv(
+                'KNOWLEDGE_INDEX_DIR',
+                os.path.join(os.path.dirname(__file__), '..', 'kb_index')
+            )
+            self.knowledge_base = KnowledgeBase(corpus_dir, index_dir)
+            indexed, removed = self.knowledge_base.refresh()
+            print(f"Knowledge base: {self.knowledge_base.total_docs} passages "
+                  f"({indexed} files re-indexed, {removed} removed)")
+            # Pick up documents edited while the assistant is running, 0 disables it
+            refresh_interval = float(os.getenv('KB_REFRESH_INTERVAL', '30'))
+            if refresh_interval > 0:
+                self.knowledge_base.start_watching(refresh_interval)
+            self.available_functions["search_knowledge_base"] = self.knowledge_base.search_knowledge_base
+            self.function_schemas.append({
+                "name": "search_knowledge_base",
+                "description": "Search the local knowledge base of documents. Fast and works offline, "
+                               "try it before searching the web for factual questions that are not about current events",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "The search query"
+                        },
+                        "num_results": {
+                            "type": "integer",
+                            "description": "Number of passages to return (default: 3)"
+                        }
+                    },
+                    "required": ["query"]
+                }
+            })
+
+    def _create_backend(self, provider):
+        if provider == 'openai':
+            return OpenAIBackend(
+                os.getenv('OPENAI_API_KEY'),
+                os.getenv('OPENAI_MODEL', 'gpt-4o-mini'),
+                self.max_tokens
+            )
+        return LocalBackend(
+            os.getenv('LM_STUDIO_API_URL'),
+            os.getenv('LM_STUDIO_API_KEY'),
+            self.max_tokens
+        )
 
     def _load_system_prompt(self):
         """Load the system prompt from file"""
@@ -80,178 +136,141 @@ class LLMClient:
             print(f"Error loading system prompt: {e}")
             return "You are a helpful AI assistant."
 
-    def _make_llm_call(self, messages, include_functions=True):
-        """Make a call to the LLM (either OpenAI or local)"""
+    def _make_llm_call(self, messages, include_functions=True, budget=None):
+        """Make a call to the LLM backend, limited to the time left in the budget"""
+        budget = budget or LatencyBudget(float('inf'))
+        with budget.stage("llm" if include_functions else "llm_final"):
+            return self._send_llm_request(messages, include_functions, budget.timeout(self.request_timeout))
+
+    def _send_llm_request(self, messages, include_functions, timeout):
         try:
-            self.debug_print(f"\n[DEBUG] Sending request to {self.provider} LLM...")
-            
-            if self.provider == 'openai':
-                # Prepare OpenAI request
-                kwargs = {
-                    "model": self.model,
-                    "messages": messages,
-                    "temperature": 0.7,
-                    "max_tokens": self.max_tokens
-                }
-                if include_functions:
-                    kwargs.update({
-                        "functions": self.function_schemas,
-                        "function_call": "auto"
-                    })
-                response = self.client.chat.completions.create(**kwargs)
-                return response.choices[0].message
-                
-            else:  # local
-                # Prepare local LLM request
-                request_data = {
-                    "model": "local-model",
-                    "messages": messages,
-                    "temperature": 0.7,
-                    "max_tokens": self.max_tokens,
-                    "stream": False,
-                    "tools": [
-                        {
-                            "type": "function",
-                            "function": schema
-                        } for schema in self.function_schemas
-                    ] if include_functions else None,
-                    "tool_choice": "auto" if include_functions else "none"
-                }
-                
-                self.debug_print("\n[DEBUG] Local LLM request data:")
-                self.debug_print(json.dumps(request_data, indent=2))
-                
-                response = requests.post(
-                    f"{self.api_url}/chat/completions",
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {self.api_key}"
-                    },
-                    json=request_data
-                )
-                
-                if response.status_code != 200:
-                    self.debug_print(f"\n[DEBUG] Error from LLM: {response.status_code}")
-                    self.debug_print(f"Response: {response.text}")
-                    return None
-                
-                response_data = response.json()
-                self.debug_print("\n[DEBUG] Local LLM response data:")
-                self.debug_print(json.dumps(response_data, indent=2))
-                
-                # Handle tool calls (function calls)
-                message = response_data['choices'][0]['message']
-                if 'tool_calls' in message:  # Convert tool_calls to function_call format
-                    tool_call = message['tool_calls'][0]
-                    message['function_call'] = {
-                        'name': tool_call['function']['name'],
-                        'arguments': tool_call['function']['arguments']
-                    }
-                
-                return message
-                
+            log.debug("Sending request to %s LLM...", self.backend.name)
+            return self.backend.complete(
+                messages,
+                self.function_schemas if include_functions else None,
+                timeout
+            )
         except Exception as e:
-            self.debug_print(f"\n[DEBUG] LLM error: {e}")
-            self.debug_print(traceback.format_exc())
+            log.debug("LLM error: %s", e, exc_info=True)
             return None
+        finally:
+            if isinstance(self.backend, HedgedBackend):
+                log.debug("%s", Lazy(self.backend.report))
 
-    def _handle_function_call(self, response_message, messages):
-        """Handle function calling for both providers"""
+    def _handle_function_call(self, response_message, messages, budget):
+        """Run the function the model asked for and get the final response"""
         try:
             # Extract function call details
-            if self.provider == 'openai':
-                # Check if function_call exists and has required attributes
-                if not hasattr(response_message, 'function_call'):
-                    self.debug_print("\n[DEBUG] No function call in response")
-                    return response_message.content
-                    
-                function_name = response_message.function_call.name
-                function_args = json.loads(response_message.function_call.arguments)
-            else:
-                if 'function_call' not in response_message:
-                    self.debug_print("\n[DEBUG] No function call in response")
-                    return response_message['content']
-                    
-                function_name = response_message['function_call']['name']
-                function_args = json.loads(response_message['function_call']['arguments'])
+            if not response_message.get('function_call'):
+                log.debug("No function call in response")
+                return response_message['content']
+                
+            function_name = response_message['function_call']['name']
+            function_args = json.loads(response_message['function_call']['arguments'])
             
-            self.debug_print(f"\n[DEBUG] Function call requested:")
-            self.debug_print(f"Function: {function_name}")
-            self.debug_print(f"Arguments: {json.dumps(function_args, indent=2)}")
+            log.debug("Function call requested: %s\nArguments: %s", function_name, Payload(function_args))
             
-            # Call the function
-            function_to_call = self.available_functions[function_name]
-            self.debug_print("\n[DEBUG] Executing function...")
-            function_response = function_to_call(**function_args)
+            tool_budget = budget.child(self.final_reserve)
+            with tool_budget.stage("tool"):
+                # Reuse the speculative result if the prefetcher guessed this call
+                function_response = self.prefetcher.claim(
+                    function_name, function_args, timeout=tool_budget.timeout(floor=0)
+                )
+                if function_response is None and tool_budget.expired():
+                    # Out of time, let the model answer without the tool result
+                    log.debug("Turn budget used up, answering without %s", function_name)
+                    function_response = (
+                        f"The {function_name} tool could not be completed in time. "
+                        "Answer without it and mention the information is unavailable right now."
+                    )
+                elif function_response is None:
+                    function_to_call = self.available_functions[function_name]
+                    if function_name in self.budgeted_functions:
+                        function_args["budget"] = tool_budget
+                    log.debug("Executing function...")
+                    function_response = function_to_call(**function_args)
             
-            self.debug_print("\n[DEBUG] Adding function response to conversation:")
-            self.debug_print(f"Response: {function_response}")
+            log.debug("Adding function response to conversation:\n%s", Payload(function_response))
             
-            # Add function response to messages with appropriate role
-            if self.provider == 'openai':
-                messages.append({
-                    "role": "function",
-                    "name": function_name,
-                    "content": function_response
-                })
-            else:
-                messages.append({
-                    "role": "tool",  # Use 'tool' role for local LLM
-                    "name": function_name,
-                    "content": function_response
-                })
+            # Backends convert the role if their API expects something else
+            messages.append({
+                "role": "function",
+                "name": function_name,
+                "content": function_response
+            })
             
             # Get final response
-            self.debug_print("\n[DEBUG] Getting final response from LLM...")
-            final_message = self._make_llm_call(messages, include_functions=False)
+            log.debug("Getting final response from LLM...")
+            final_message = self._make_llm_call(messages, include_functions=False, budget=budget)
             
             if not final_message:
                 return None
                 
-            final_response = final_message.content if self.provider == 'openai' else final_message['content']
-            self.debug_print(f"\n[DEBUG] Final response: {final_response}")
+            final_response = final_message['content']
+            log.debug("Final response: %s", final_response)
             return final_response
             
         except Exception as e:
-            self.debug_print(f"\n[DEBUG] Function handling error: {e}")
-            self.debug_print(traceback.format_exc())
+            log.debug("Function handling error: %s", e, exc_info=True)
             return None
 
-    def get_response(self, prompt):
-        """Get response from LLM with function calling support"""
-        try:
-            # Build messages with conversation history
-            messages = [
-                {"role": "system", "content": self.system_prompt}
-            ]
-            
-            # Add conversation history
-            for msg in self.conversation_history:
-                messages.append(msg)
-                
-            # Add current prompt
-            messages.append({"role": "user", "content": prompt})
+    def _build_messages(self, prompt):
+        """Build the message list for a prompt from the system prompt and history"""
+        messages = [
+            {"role": "system", "content": self.system_prompt}
+        ]
+        
+        # Add conversation history
+        for msg in self.conversation_history:
+            messages.append(msg)
             
-            # Get initial response
-            response_message = self._make_llm_call(messages)
+        # Add current prompt
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    def get_initial_message(self, prompt, budget=None):
+        """Make only the first LLM call for a prompt, without touching the history.
+
+        Used for speculative turns, the result can be passed back to get_response
+        as initial_message once the turn is confirmed. Any likely tool call is
+        prefetched as in get_response, and can be claimed when the turn is confirmed.
+        """
+        budget = budget or LatencyBudget(float('inf'))
+        self.prefetcher.start(prompt, budget=budget.child(self.final_reserve))
+        return self._make_llm_call(self._build_messages(prompt), budget=budget)
+
+    def get_response(self, prompt, initial_message=None, budget=None):
+        """Get response from LLM with function calling support.
+
+        With a LatencyBudget every request and tool call is limited to the time
+        left in the turn, without one only the per request timeouts apply.
+        """
+        budget = budget or LatencyBudget(float('inf'))
+        try:
+            messages = self._build_messages(prompt)
+
+            if initial_message:
+                response_message = initial_message
+            else:
+                # Start any likely tool call in parallel with the first LLM call
+                self.prefetcher.start(prompt, budget=budget.child(self.final_reserve))
+
+                # Get initial response
+                response_message = self._make_llm_call(messages, budget=budget)
+
             if not response_message:
-                self.debug_print("\n[DEBUG] No response from LLM")
+                log.debug("No response from LLM")
                 return "I apologize, but I encountered an error processing your request."
             
             # Check for function call
-            has_function_call = (
-                (self.provider == 'openai' and hasattr(response_message, 'function_call') and response_message.function_call is not None) or
-                (self.provider == 'local' and 'function_call' in response_message and response_message['function_call'] is not None)
-            )
-            
-            if has_function_call:
-                assistant_response = self._handle_function_call(response_message, messages)
+            if response_message.get('function_call'):
+                assistant_response = self._handle_function_call(response_message, messages, budget)
                 if not assistant_response:
-                    self.debug_print("\n[DEBUG] Error in function handling")
+                    log.debug("Error in function handling")
                     return "I apologize, but I encountered an error while processing the function call."
             else:
-                assistant_response = response_message.content if self.provider == 'openai' else response_message['content']
-                self.debug_print(f"\n[DEBUG] Direct response (no function call): {assistant_response}")
+                assistant_response = response_message['content']
+                log.debug("Direct response (no function call): %s", assistant_response)
             
             if assistant_response:
                 # Update conversation history
@@ -261,9 +280,11 @@ class LLMClient:
             return assistant_response
                 
         except Exception as e:
-            self.debug_print(f"\n[DEBUG] Error in get_response: {e}")
-            self.debug_print(traceback.format_exc())
+            log.debug("Error in get_response: %s", e, exc_info=True)
             return "I apologize, but I encountered an error processing your request."
+        finally:
+            self.prefetcher.discard()
+            log.debug("%s", Lazy(self.prefetcher.report))
 
     def clear_history(self):
         """Clear the conversation history"""
@@ -1,5 +1,7 @@
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 import sounddevice as sd
 import soundfile as sf
 from dotenv import load_dotenv
@@ -7,15 +9,34 @@ from audio_recorder import AudioRecorder
 from speech_to_text import SpeechToText
 from text_to_speech import TextToSpeech
 from llm_client import LLMClient
+from turn_speculator import TurnSpeculator
+from speech_gate import SpeechGate
+from latency_budget import LatencyBudget
+from debug_log import get_logger, Lazy
 
 load_dotenv()
+log = get_logger("main")
 
 class VoiceAssistant:
     def __init__(self):
-        self.recorder = AudioRecorder()
-        self.stt = SpeechToText()
-        self.tts = TextToSpeech()
-        self.llm = LLMClient(max_history=10)
+        self.startup_timings = {}
+        self.startup_started = time.perf_counter()
+
+        # Bring the microphone and VAD up first so we can start listening straight
+        # away, audio is captured while the slower components are still loading
+        self.recorder = self._timed_init("AudioRecorder", AudioRecorder)
+        self.gate = SpeechGate(self.recorder.sample_rate)
+
+        # The remaining components are independent of each other, so load them concurrently
+        executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup")
+        self._components = {
+            "stt": executor.submit(self._timed_init, "SpeechToText", SpeechToText),
+            "tts": executor.submit(self._timed_init, "TextToSpeech", TextToSpeech),
+            "llm": executor.submit(self._timed_init, "LLMClient", lambda: LLMClient(max_history=10)),
+        }
+        executor.submit(self._warm_phrase_cache)
+        executor.shutdown(wait=False)
+        threading.Thread(target=self.print_startup_report, daemon=True).start()
         
         # Define multiple wake words/phrases
         self.wake_words = [
@@ -33,18 +54,77 @@ class VoiceAssistant:
         self.conversation_timeout = 20  # seconds
         self.last_response_time = 0
         self.in_conversation = False
-        self.debug = os.getenv('DEBUG_MODE', 'false').lower() == 'true'
+        self.speculator = TurnSpeculator(self.speculate_turn)
+
+        # Time allowed from the end of speech to the start of the spoken response
+        self.turn_budget = float(os.getenv('TURN_BUDGET', '20'))
+        # Part of the turn budget kept back for speech synthesis
+        self.tts_reserve = float(os.getenv('TTS_RESERVE', '3'))
+        # Stage name -> (turns over budget, total seconds over)
+        self.budget_overruns = {}
         
-    def debug_print(self, *args, **kwargs):
-        if self.debug:
-            print(*args, **kwargs)
+    def _timed_init(self, name, factory):
+        """Construct a component and record how long it took"""
+        start = time.perf_counter()
+        try:
+            return factory()
+        finally:
+            self.startup_timings[name] = time.perf_counter() - start
+
+    @property
+    def stt(self):
+        return self._components["stt"].result()
+
+    @property
+    def tts(self):
+        return self._components["tts"].result()
+
+    @property
+    def llm(self):
+        return self._components["llm"].result()
+
+    def _warm_phrase_cache(self):
+        try:
+            self.tts.warm_phrase_cache([
+                "Yes, Sir?",
+                "I apologize, but I encountered an error processing your request.",
+            ])
+        except Exception as e:
+            log.warning("Could not warm the phrase cache: %s", e)
+
+    def check_startup(self):
+        """Exit if a component failed to load, the assistant cannot work without it"""
+        for name, future in self._components.items():
+            if future.done() and future.exception():
+                raise SystemExit(f"Error initialising {name}: {future.exception()}")
+
+    def record_budget(self, budget):
+        """Add the overruns from a turn's budget to the running totals"""
+        for stage, seconds in budget.overruns.items():
+            count, total = self.budget_overruns.get(stage, (0, 0.0))
+            self.budget_overruns[stage] = (count + 1, total + seconds)
+        if budget.overruns:
+            log.debug("Turn over budget: %s, timings: %s, totals: %s",
+                      budget.overruns, budget.timings, self.budget_overruns)
+
+    def print_startup_report(self):
+        """Wait for all components to load and print how long each one took"""
+        wait(self._components.values())
+        total = time.perf_counter() - self.startup_started
+        print("\nStartup timing:")
+        for name, seconds in sorted(self.startup_timings.items(), key=lambda item: -item[1]):
+            print(f"- {name}: {seconds:.2f}s")
+        print(f"Sequential cost: {sum(self.startup_timings.values()):.2f}s, wall clock: {total:.2f}s")
+        for name, future in self._components.items():
+            if future.exception():
+                print(f"Error initialising {name}: {future.exception()}")
 
     def check_wake_word(self, text):
         """Check if any wake word is present in text"""
         text_lower = text.lower()
         for wake_word in self.wake_words:
             if wake_word in text_lower:
-                self.debug_print(f"\n[DEBUG] Wake word detected: '{wake_word}'")
+                log.debug("Wake word detected: '%s'", wake_word)
                 return wake_word
         return None
 
@@ -59,12 +139,58 @@ class VoiceAssistant:
         
         time_since_last_response = time.time() - self.last_response_time
         if time_since_last_response > self.conversation_timeout:
-            self.debug_print("\n[DEBUG] Conversation timeout reached")
+            log.debug("Conversation timeout reached")
             self.in_conversation = False
             return False
             
         return True
 
+    def is_command(self, text):
+        """Check if text is one of the special commands handled by handle_commands"""
+        return text.lower().strip() in ("clear memory", "clear history", "show history", "show memory")
+
+    def speculative_prompt(self, text):
+        """Work out the prompt the main loop would send for text, without changing any state"""
+        active = (
+            self.in_conversation
+            and time.time() - self.last_response_time <= self.conversation_timeout
+        )
+        if not active:
+            detected_wake_word = self.check_wake_word(text)
+            if not detected_wake_word:
+                return None
+            text = self.remove_wake_word(text, detected_wake_word)
+        if not text or self.is_command(text):
+            return None
+        return text
+
+    def transcribe(self, audio_data):
+        """Transcribe audio, recording the Whisper cost for the speech gate report"""
+        start = time.perf_counter()
+        text = self.stt.transcribe(audio_data)
+        self.gate.record_asr(time.perf_counter() - start)
+        return text
+
+    def speculate_turn(self, audio_data, cancel_event):
+        """Transcribe and make the first LLM call on a pause, used by the TurnSpeculator"""
+        # The turn's own budget only starts once the end of speech is confirmed,
+        # this one stops a stuck LLM call from outliving it
+        budget = LatencyBudget(self.turn_budget)
+        speculation = {"text": "", "prompt": None, "message": None}
+        if not self.gate.accept(audio_data, count=False):
+            return speculation
+
+        speculation["text"] = self.transcribe(audio_data)
+        if cancel_event.is_set() or not speculation["text"]:
+            return speculation
+
+        speculation["prompt"] = self.speculative_prompt(speculation["text"])
+        if speculation["prompt"] and not cancel_event.is_set():
+            speculation["message"] = self.llm.get_initial_message(
+                speculation["prompt"], budget=budget.child(self.tts_reserve)
+            )
+        return speculation
+
     def play_audio(self, file_path):
         """Play audio file using sounddevice"""
         try:
@@ -109,33 +235,59 @@ class VoiceAssistant:
         print("="*50 + "\n")
         
         while True:
+            self.check_startup()
             try:
                 print("\nListening for speech...")
-                audio_data = self.recorder.record_until_silence()
+                if self.speculator.enabled:
+                    audio_data = self.recorder.record_until_silence(
+                        on_pause=self.speculator.start,
+                        on_resume=self.speculator.cancel
+                    )
+                else:
+                    audio_data = self.recorder.record_until_silence()
+                self.check_startup()
                 
-                if audio_data is not None and len(audio_data) > 0:
-                    print("\nTranscribing speech...")
-                    text = self.stt.transcribe(audio_data)
+                if audio_data is not None and len(audio_data) > 0 and not self.gate.accept(audio_data):
+                    self.speculator.discard()
+                    print("Ignoring non-speech audio")
+                    log.debug("%s", Lazy(self.gate.report))
+                elif audio_data is not None and len(audio_data) > 0:
+                    if not self._components["stt"].done():
+                        print("\nWaiting for speech recognition to finish loading...")
+                        wait([self._components["stt"]])
+                        self.check_startup()
+                    budget = LatencyBudget(self.turn_budget)
+
+                    # Only trailing silence was added since the pause, so a speculative transcript still holds.
+                    # An empty one is not trusted, the partial audio may have been gated or failed to transcribe
+                    with budget.stage("speculation"):
+                        speculation = self.speculator.confirm(timeout=budget.timeout(floor=0))
+                    if speculation and speculation["text"]:
+                        text = speculation["text"]
+                    else:
+                        print("\nTranscribing speech...")
+                        with budget.stage("stt"):
+                            text = self.transcribe(audio_data)
                     
                     if text:
-                        self.debug_print(f"\n[DEBUG] Transcribed text: {text}")
+                        log.debug("Transcribed text: %s", text)
                         
                         # Check if we need wake word
                         if not self.is_conversation_active():
                             detected_wake_word = self.check_wake_word(text)
                             if not detected_wake_word:
-                                self.debug_print("\n[DEBUG] Wake word not detected")
+                                log.debug("Wake word not detected")
                                 continue
                         
                         # If wake word detected, start conversation
                         detected_wake_word = self.check_wake_word(text)
                         if detected_wake_word and not self.is_conversation_active():
-                            self.debug_print("\n[DEBUG] Starting conversation")
+                            log.debug("Starting conversation")
                             self.in_conversation = True
                             # Remove wake word from text
                             text = self.remove_wake_word(text, detected_wake_word)
                             if not text:  # If only wake word was spoken
-                                self.debug_print("\n[DEBUG] Only wake word was spoken")
+                                log.debug("Only wake word was spoken")
                                 output_path = self.tts.speak("Yes, Sir?")
                                 if output_path:
                                     self.play_audio(output_path)
@@ -156,14 +308,22 @@ class VoiceAssistant:
                         
                         # Get response from LLM
                         print("\nGetting AI response...")
-                        response = self.llm.get_response(text)
+                        initial_message = None
+                        if speculation and speculation["prompt"] == text:
+                            initial_message = speculation["message"]
+                        response = self.llm.get_response(
+                            text,
+                            initial_message=initial_message,
+                            budget=budget.child(self.tts_reserve)
+                        )
                         
                         if response:
                             print(f"\nAssistant: {response}")
                             
                             # Convert response to speech
                             print("\nGenerating speech...")
-                            output_path = self.tts.speak(response)
+                            output_path = self.tts.speak(response, budget=budget)
+                            self.record_budget(budget)
                             
                             if output_path:
                                 # Play the response
@@ -177,6 +337,7 @@ class VoiceAssistant:
                             self.tts.speak("I apologize, but I encountered an error processing your request.")
                             self.last_response_time = time.time()
                 else:
+                    self.speculator.discard()
                     print("No speech detected in audio")
                 
             except KeyboardInterrupt:
@@ -0,0 +1,120 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from debug_log import get_logger
+
+load_dotenv()
+log = get_logger("gate")
+
+class SpeechGate:
+    """Cheap check that drops obvious non-speech before it reaches Whisper"""
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.enabled = os.getenv('SPEECH_GATE', 'true').lower() == 'true'
+
+        self.frame_ms = 20
+        # A frame is voiced if it is this many dB above the noise floor of the utterance
+        self.voiced_db = float(os.getenv('GATE_VOICED_DB', '10'))
+        self.min_voiced_duration = float(os.getenv('GATE_MIN_VOICED_DURATION', '0.25'))
+        self.min_voiced_ratio = float(os.getenv('GATE_MIN_VOICED_RATIO', '0.05'))
+        # Speech is tonal, noise (coughs, hiss, static) has a flat spectrum
+        self.max_flatness = float(os.getenv('GATE_MAX_FLATNESS', '0.4'))
+        # Share of the energy in the loudest 100 ms, impulsive sounds like door slams concentrate it
+        self.max_peak_share = float(os.getenv('GATE_MAX_PEAK_SHARE', '0.7'))
+        # Any sound shorter than a few windows has most of its energy in one, so one word
+        # replies like "yes" or "stop" would look impulsive. Only apply the rule to longer sounds
+        self.peak_min_duration = float(os.getenv('GATE_PEAK_MIN_DURATION', '0.5'))
+
+        self.stats = {
+            "checked": 0,
+            "rejected": 0,
+            "rejected_audio_seconds": 0.0,
+            "asr_runs": 0,
+            "asr_seconds": 0.0,
+        }
+
+    def features(self, audio):
+        """Compute utterance level features used to tell speech from noise"""
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.size and np.abs(audio).max() > 1.0:  # int16 scaled samples
+            audio = audio / 32768.0
+
+        frame_len = int(self.sample_rate * self.frame_ms / 1000)
+        n_frames = len(audio) // frame_len
+        features = {
+            "duration": len(audio) / self.sample_rate,
+            "voiced_duration": 0.0,
+            "voiced_ratio": 0.0,
+            "spectral_flatness": 1.0,
+            "peak_energy_share": 1.0,
+        }
+        if n_frames == 0:
+            return features
+
+        frames = audio[:n_frames * frame_len].reshape(n_frames, frame_len)
+        energy = np.mean(frames ** 2, axis=1) + 1e-10
+        noise_floor = np.percentile(energy, 10)
+        # Never treat anything below about -60 dBFS as voiced, even in a silent room
+        voiced = energy > max(noise_floor * 10 ** (self.voiced_db / 10), 1e-6)
+        if not voiced.any():
+            return features
+
+        features["voiced_duration"] = float(voiced.sum() * self.frame_ms / 1000)
+        features["voiced_ratio"] = float(voiced.mean())
+
+        spectrum = np.abs(np.fft.rfft(frames[voiced] * np.hanning(frame_len), axis=1)) ** 2 + 1e-12
+        flatness = np.exp(np.mean(np.log(spectrum), axis=1)) / np.mean(spectrum, axis=1)
+        features["spectral_flatness"] = float(np.median(flatness))
+
+        voiced_energy = np.where(voiced, energy, 0.0)
+        window = max(1, 100 // self.frame_ms)
+        if n_frames > window:
+            windowed = np.convolve(voiced_energy, np.ones(window), mode='valid')
+        else:
+            windowed = voiced_energy.sum(keepdims=True)
+        features["peak_energy_share"] = float(windowed.max() / voiced_energy.sum())
+        return features
+
+    def check(self, audio):
+        """Return (is_speech, reason, features) for an utterance"""
+        features = self.features(audio)
+        if features["voiced_duration"] < self.min_voiced_duration:
+            return False, "too short", features
+        if features["voiced_ratio"] < self.min_voiced_ratio:
+            return False, "too little voiced audio", features
+        if features["spectral_flatness"] > self.max_flatness:
+            return False, "noise-like spectrum", features
+        if (features["voiced_duration"] >= self.peak_min_duration
+                and features["peak_energy_share"] > self.max_peak_share):
+            return False, "impulsive energy", features
+        return True, None, features
+
+    def accept(self, audio, count=True):
+        """Check if an utterance is worth transcribing, count=False keeps it out of the stats"""
+        if not self.enabled:
+            return True
+
+        is_speech, reason, features = self.check(audio)
+        if count:
+            self.stats["checked"] += 1
+            if not is_speech:
+                self.stats["rejected"] += 1
+                self.stats["rejected_audio_seconds"] += features["duration"]
+        if not is_speech:
+            log.debug("Speech gate rejected audio (%s): %s", reason, features)
+        return is_speech
+
+    def record_asr(self, seconds):
+        """Record the cost of a Whisper run, used to estimate the compute avoided"""
+        self.stats["asr_runs"] += 1
+        self.stats["asr_seconds"] += seconds
+
+    def report(self):
+        """Summarise how much ASR work the gate avoided"""
+        runs = self.stats["asr_runs"]
+        avoided = self.stats["rejected"] * (self.stats["asr_seconds"] / runs if runs else 0.0)
+        return (
+            f"Speech gate: {self.stats['rejected']}/{self.stats['checked']} utterances rejected "
+            f"({self.stats['rejected_audio_seconds']:.1f}s of audio), ~{avoided:.1f}s of ASR avoided"
+        )
@@ -1,17 +1,24 @@
-from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
-import torch
 import os
+import threading
 import numpy as np
 from dotenv import load_dotenv
+from debug_log import get_logger
 
 load_dotenv()
+log = get_logger("stt")
 
 class SpeechToText:
     def __init__(self):
+        # torch and transformers are imported here rather than at module level so
+        # that importing this module stays cheap and the load can run on a worker thread
+        import torch
+        from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
+
         self.device = "cuda:0" if torch.cuda.is_available() else "cpu"
         self.torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
         
         self.model_id = os.getenv('WHISPER_MODEL')
+        log.debug("Loading Whisper model %s on %s", self.model_id, self.device)
         self.model = AutoModelForSpeechSeq2Seq.from_pretrained(
             self.model_id, 
             torch_dtype=self.torch_dtype,
@@ -29,6 +36,45 @@ class SpeechToText:
             torch_dtype=self.torch_dtype,
             device=self.device,
         )
+        # Speculative turns can transcribe from another thread, run one at a time
+        self.lock = threading.Lock()
+
+        # Optional assisted generation, a small draft model proposes tokens and the main
+        # model verifies them, so the output is the same as the main model on its own
+        self.generate_kwargs = {}
+        self.draft_model_id = os.getenv('WHISPER_DRAFT_MODEL')
+        if self.draft_model_id:
+            self.draft_model = self._load_draft_model(AutoModelForSpeechSeq2Seq)
+            if self.draft_model is not None:
+                self.generate_kwargs["assistant_model"] = self.draft_model
+
+    def _load_draft_model(self, model_class):
+        """Load the draft model, or return None if it cannot be used with the main model"""
+        cache_dir = os.getenv(
+            'WHISPER_DRAFT_CACHE',
+            os.path.join(os.path.dirname(__file__), '..', 'models')
+        )
+        try:
+            draft_model = model_class.from_pretrained(
+                self.draft_model_id,
+                torch_dtype=self.torch_dtype,
+                low_cpu_mem_usage=True,
+                use_safetensors=True,
+                cache_dir=cache_dir
+            ).to(self.device)
+        except Exception as e:
+            print(f"Error loading Whisper draft model {self.draft_model_id}: {e}")
+            return None
+
+        # The draft must share the tokenizer and input features of the main model
+        for attribute in ("vocab_size", "num_mel_bins"):
+            if getattr(draft_model.config, attribute) != getattr(self.model.config, attribute):
+                print(f"Whisper draft model {self.draft_model_id} does not match {self.model_id} "
+                      f"({attribute}), assisted generation disabled")
+                return None
+
+        print(f"Using Whisper draft model: {self.draft_model_id}")
+        return draft_model
 
     def transcribe(self, audio_array):
         try:
@@ -40,8 +86,11 @@ class SpeechToText:
             if audio_array.dtype == np.int16:
                 audio_array = audio_array.astype(np.float32) / 32768.0
             
-            result = self.pipe(audio_array)
+            with self.lock:
+                result = self.pipe(audio_array, generate_kwargs=dict(self.generate_kwargs))
+            log.debug("Transcribed %.2fs of audio", len(audio_array) / self.processor.feature_extractor.sampling_rate)
             return result["text"].strip()
         except Exception as e:
             print(f"Transcription error: {e}")
+            log.debug("Transcription error", exc_info=True)
             return "" 
\ No newline at end of file
@@ -1,20 +1,24 @@
 import os
 import re
-from google.cloud import texttospeech
 from dotenv import load_dotenv
 import base64
+from debug_log import get_logger
+from latency_budget import LatencyBudget
 
 load_dotenv()
+log = get_logger("tts")
 
 class TextToSpeech:
     def __init__(self):
+        # Imported lazily, the Google client library is slow to import
+        from google.cloud import texttospeech
+
         # Initialize Google Cloud client
         self.client = texttospeech.TextToSpeechClient()
         
         # Get voice settings from environment
         self.language = os.getenv('GOOGLE_TTS_LANGUAGE', 'en-GB')
         self.voice = os.getenv('GOOGLE_TTS_VOICE', 'en-GB-Standard-D')
-        self.debug = os.getenv('DEBUG_MODE', 'false').lower() == 'true'
         
         # Configure voice settings
         self.voice_selection = texttospeech.VoiceSelectionParams(
@@ -33,9 +37,12 @@ class TextToSpeech:
         self.output_dir = os.path.join(os.path.dirname(__file__), '..', 'output')
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def debug_print(self, *args, **kwargs):
-        if self.debug:
-            print(*args, **kwargs)
+        # Longest a synthesis request may take, a turn budget can shorten it further
+        self.request_timeout = float(os.getenv('TTS_TIMEOUT', '10'))
+        # Played instead of the response when the turn budget runs out
+        self.fallback_phrase = os.getenv('TTS_FALLBACK_PHRASE', "I'm sorry Sir, that took longer than expected.")
+        # Text -> path of audio synthesized ahead of time for fixed phrases
+        self.phrase_cache = {}
 
     def extract_speech_text(self, text):
         """Extract text to be spoken, handling think wrapper if present"""
@@ -52,51 +59,80 @@ class TextToSpeech:
             # Clean up any extra whitespace
             speech_text = re.sub(r'\s+', ' ', speech_text).strip()
             
-            self.debug_print("\n[DEBUG] Found think wrapper")
-            self.debug_print(f"[DEBUG] Original text length: {len(text)}")
-            self.debug_print(f"[DEBUG] Speech text length: {len(speech_text)}")
+            log.debug("Found think wrapper, original text length: %d, speech text length: %d",
+                      len(text), len(speech_text))
             
             return speech_text
         else:
             # No think wrapper, use entire text
-            self.debug_print("\n[DEBUG] No think wrapper found, using full text")
+            log.debug("No think wrapper found, using full text")
             return text.strip()
 
-    def speak(self, text):
-        """Convert text to speech using Google Cloud TTS"""
+    def _synthesize(self, speech_text, output_path, timeout):
+        """Synthesize speech_text and save the audio to output_path"""
+        from google.cloud import texttospeech
+
+        # Set the text input to be synthesized
+        synthesis_input = texttospeech.SynthesisInput(text=speech_text)
+
+        # Perform the text-to-speech request
+        response = self.client.synthesize_speech(
+            input=synthesis_input,
+            voice=self.voice_selection,
+            audio_config=self.audio_config,
+            timeout=timeout
+        )
+
+        # Save the audio file
+        with open(output_path, 'wb') as out:
+            out.write(response.audio_content)
+            
+        log.debug("Audio saved to: %s", output_path)
+        return output_path
+
+    def warm_phrase_cache(self, phrases):
+        """Synthesize fixed phrases ahead of time so they play instantly and work as fallbacks"""
+        for index, phrase in enumerate([self.fallback_phrase] + list(phrases)):
+            if phrase in self.phrase_cache:
+                continue
+            try:
+                output_path = os.path.join(self.output_dir, f'phrase_{index}.wav')
+                self.phrase_cache[phrase] = self._synthesize(phrase, output_path, self.request_timeout)
+            except Exception as e:
+                log.debug("Could not cache phrase '%s': %s", phrase, e)
+
+    def fallback_audio(self):
+        """Cached fallback phrase to play when there is no time left, or None if not cached"""
+        log.debug("Turn budget used up, falling back to cached phrase")
+        return self.phrase_cache.get(self.fallback_phrase)
+
+    def speak(self, text, budget=None):
+        """Convert text to speech using Google Cloud TTS, limited to the time left in the budget"""
+        budget = budget or LatencyBudget(float('inf'))
         try:
+            if text in self.phrase_cache:
+                return self.phrase_cache[text]
+
             # Extract text to be spoken
             speech_text = self.extract_speech_text(text)
             
             if not speech_text:
-                self.debug_print("\n[DEBUG] No text to speak after processing")
+                log.debug("No text to speak after processing")
                 return None
+
+            if budget.expired():
+                return self.fallback_audio()
                 
-            self.debug_print(f"\n[DEBUG] Converting to speech: {speech_text}")
+            log.debug("Converting to speech: %s", speech_text)
             
-            # Set the text input to be synthesized
-            synthesis_input = texttospeech.SynthesisInput(text=speech_text)
-
-            # Perform the text-to-speech request
-            response = self.client.synthesize_speech(
-                input=synthesis_input,
-                voice=self.voice_selection,
-                audio_config=self.audio_config
-            )
-
-            # Save the audio file
             output_path = os.path.join(self.output_dir, 'output.wav')
-            with open(output_path, 'wb') as out:
-                out.write(response.audio_content)
-                
-            self.debug_print(f"[DEBUG] Audio saved to: {output_path}")
-            return output_path
+            with budget.stage("tts"):
+                return self._synthesize(speech_text, output_path, budget.timeout(self.request_timeout))
 
         except Exception as e:
-            self.debug_print(f"\n[DEBUG] TTS error: {e}")
-            if self.debug:
-                import traceback
-                self.debug_print(traceback.format_exc())
+            log.debug("TTS error: %s", e, exc_info=True)
+            if budget.expired():
+                return self.fallback_audio()
             return None
 
     def __del__(self):
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from dotenv import load_dotenv
+from debug_log import get_logger
+
+load_dotenv()
+log = get_logger("prefetch")
+
+class ToolPrefetcher:
+    """Speculatively run the tool call we expect the LLM to make while its first call is in flight"""
+
+    # Transcripts that almost always end in a web search
+    SEARCH_PATTERN = re.compile(
+        r"\b(weather|forecast|temperature|rain(ing)?|news|headlines?|latest|today'?s|tonight|"
+        r"current(ly)?|score|results?|price|stock|exchange rate|who won|happening)\b",
+        re.I
+    )
+    STOP_WORDS = {
+        "a", "an", "the", "is", "are", "was", "what", "whats", "what's", "can", "could", "you",
+        "please", "tell", "me", "about", "for", "in", "on", "of", "to", "like", "will", "be",
+        "it", "do", "does", "give", "find", "search", "look", "up", "sir", "jarvis"
+    }
+
+    def __init__(self, web_tools):
+        self.web_tools = web_tools
+        self.enabled = os.getenv('TOOL_PREFETCH', 'true').lower() == 'true'
+        # Minimum Jaccard similarity between the keywords of the guessed and the actual query to reuse a result
+        self.match_threshold = float(os.getenv('TOOL_PREFETCH_MATCH', '0.6'))
+
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+        self.pending = None
+        self.lock = threading.Lock()
+        self.stats = {
+            "predictions": 0,
+            "hits": 0,
+            "misses": 0,
+            "unused": 0,
+            "saved_seconds": 0.0,
+        }
+
+    def _keywords(self, text):
+        words = re.findall(r"[\w']+", text.lower())
+        return {word for word in words if word not in self.STOP_WORDS}
+
+    def predict(self, transcript):
+        """Guess the tool call for a transcript, returns (function_name, args) or None"""
+        if not self.SEARCH_PATTERN.search(transcript):
+            return None
+        query = transcript.strip().rstrip("?.!")
+        if not self._keywords(query):
+            return None
+        return "search_web", {"query": query, "num_results": 3}
+
+    def _run(self, pending):
+        try:
+            return self.web_tools.search_web(
+                cancel_event=pending["cancel_event"], budget=pending["budget"], **pending["args"]
+            )
+        finally:
+            pending["finished"] = time.perf_counter()
+
+    def start(self, transcript, budget=None):
+        """Start prefetching the predicted tool call for a transcript, if any"""
+        if not self.enabled:
+            return
+        self.discard()
+        prediction = self.predict(transcript)
+        if not prediction:
+            return
+
+        function_name, args = prediction
+        pending = {
+            "function": function_name,
+            "args": args,
+            "budget": budget,
+            "cancel_event": threading.Event(),
+            "started": time.perf_counter(),
+            "finished": None,
+        }
+        pending["future"] = self.executor.submit(self._run, pending)
+        with self.lock:
+            self.pending = pending
+            self.stats["predictions"] += 1
+        log.debug("Prefetching %s with %s", function_name, args)
+
+    def _cancel(self, pending):
+        pending["cancel_event"].set()
+        pending["future"].cancel()
+
+    def _matches(self, pending, function_name, function_args):
+        if pending["function"] != function_name:
+            return False
+        if function_args.get("num_results", 3) != pending["args"]["num_results"]:
+            return False
+        guessed = self._keywords(pending["args"]["query"])
+        actual = self._keywords(function_args.get("query", ""))
+        if not guessed or not actual:
+            return False
+        similarity = len(guessed & actual) / len(guessed | actual)
+        return similarity >= self.match_threshold
+
+    def claim(self, function_name, function_args, timeout=None):
+        """Return the prefetched result if it matches the actual call, otherwise None.
+
+        Gives up and cancels the prefetch if it has not finished within timeout seconds.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending is None:
+            return None
+
+        if not self._matches(pending, function_name, function_args):
+            self._cancel(pending)
+            self.stats["misses"] += 1
+            log.debug("Prefetch miss, model called %s with %s", function_name, function_args)
+            return None
+
+        claimed = time.perf_counter()
+        try:
+            result = pending["future"].result(timeout=timeout)
+        except TimeoutError:
+            self._cancel(pending)
+            self.stats["misses"] += 1
+            log.debug("Prefetch did not finish in time")
+            return None
+        except Exception as e:
+            log.debug("Prefetch failed: %s", e, exc_info=True)
+            self.stats["misses"] += 1
+            return None
+
+        # The work would otherwise have started at the claim, so everything that
+        # overlapped with the first LLM call is latency saved
+        duration = pending["finished"] - pending["started"]
+        saved = min(duration, claimed - pending["started"])
+        self.stats["hits"] += 1
+        self.stats["saved_seconds"] += saved
+        log.debug("Prefetch hit, saved %.2fs", saved)
+        return result
+
+    def discard(self):
+        """Cancel any prefetch that was not claimed"""
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending is not None:
+            self._cancel(pending)
+            self.stats["unused"] += 1
+
+    def report(self):
+        """Summarise the prefetch hit rate and the latency saved"""
+        predictions = self.stats["predictions"]
+        hit_rate = self.stats["hits"] / predictions if predictions else 0.0
+        return (
+            f"Tool prefetch: {self.stats['hits']}/{predictions} hits ({hit_rate:.0%}), "
+            f"{self.stats['misses']} misses, {self.stats['unused']} unused, "
+            f"{self.stats['saved_seconds']:.2f}s saved"
+        )
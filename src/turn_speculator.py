@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from dotenv import load_dotenv
+from debug_log import get_logger, Lazy
+
+load_dotenv()
+log = get_logger("speculation")
+
+class TurnSpeculator:
+    """Start processing a turn on a short pause, before the end of speech is confirmed"""
+
+    def __init__(self, work):
+        # work(audio, cancel_event) does the speculative processing and returns its result,
+        # it must not change any state the main loop relies on
+        self.work = work
+        self.enabled = os.getenv('SPECULATIVE_TURNS', 'false').lower() == 'true'
+
+        # Two workers so a cancelled run that is still finishing does not hold up the next one
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculation")
+        self.current = None
+        self.lock = threading.Lock()
+        self.stats = {
+            "started": 0,
+            "confirmed": 0,
+            "cancelled": 0,
+            "discarded": 0,
+            "timed_out": 0,
+            "saved_seconds": 0.0,
+            "wasted_seconds": 0.0,
+        }
+
+    def _run(self, speculation, audio):
+        try:
+            return self.work(audio, speculation["cancel_event"])
+        finally:
+            with self.lock:
+                speculation["finished"] = time.perf_counter()
+                if speculation["cancel_event"].is_set() and speculation["wasted"]:
+                    self.stats["wasted_seconds"] += speculation["finished"] - speculation["started"]
+
+    def start(self, audio):
+        """Speculatively process the audio captured so far"""
+        self.cancel()
+        speculation = {
+            "cancel_event": threading.Event(),
+            "started": time.perf_counter(),
+            "finished": None,
+            "wasted": False,
+        }
+        speculation["future"] = self.executor.submit(self._run, speculation, audio)
+        self.current = speculation
+        self.stats["started"] += 1
+        log.debug("Pause detected, starting speculative turn")
+
+    def _abandon(self, speculation, wasted):
+        if speculation is None:
+            return False
+        with self.lock:
+            speculation["cancel_event"].set()
+            speculation["wasted"] = wasted
+            # Runs that already finished never see the cancel, so account for them here
+            if wasted and speculation["finished"] is not None:
+                self.stats["wasted_seconds"] += speculation["finished"] - speculation["started"]
+        speculation["future"].cancel()
+        return True
+
+    def cancel(self):
+        """Abandon the current speculation because the user kept speaking"""
+        speculation, self.current = self.current, None
+        if self._abandon(speculation, wasted=True):
+            self.stats["cancelled"] += 1
+            log.debug("Speech resumed, speculative turn cancelled")
+
+    def discard(self):
+        """Drop the current speculation because the turn was not processed, e.g. the gate rejected it.
+
+        Unlike cancel this is not counted against speculation, the turn would not have been used either way.
+        """
+        speculation, self.current = self.current, None
+        if self._abandon(speculation, wasted=False):
+            self.stats["discarded"] += 1
+            log.debug("Turn not processed, speculative turn discarded")
+
+    def confirm(self, timeout=None):
+        """End of speech confirmed, return the speculative result or None if there is none.
+
+        A speculation that has not finished within timeout seconds is abandoned and None returned.
+        """
+        speculation, self.current = self.current, None
+        if speculation is None:
+            return None
+
+        confirmed = time.perf_counter()
+        try:
+            result = speculation["future"].result(timeout=timeout)
+        except TimeoutError:
+            self._abandon(speculation, wasted=True)
+            self.stats["timed_out"] += 1
+            log.debug("Speculative turn did not finish in time, abandoned")
+            return None
+        except Exception as e:
+            log.debug("Speculative turn failed: %s", e, exc_info=True)
+            return None
+
+        # Without speculation the work would only have started now
+        duration = speculation["finished"] - speculation["started"]
+        saved = min(duration, confirmed - speculation["started"])
+        self.stats["confirmed"] += 1
+        self.stats["saved_seconds"] += saved
+        log.debug("Speculative turn confirmed, saved %.2fs. %s", saved, Lazy(self.report))
+        return result
+
+    def report(self):
+        """Summarise latency saved against compute wasted on cancelled speculations"""
+        return (
+            f"Speculative turns: {self.stats['confirmed']} confirmed, "
+            f"{self.stats['cancelled']} cancelled, {self.stats['discarded']} discarded, "
+            f"{self.stats['timed_out']} timed out "
+            f"of {self.stats['started']}, "
+            f"{self.stats['saved_seconds']:.2f}s latency saved, "
+            f"{self.stats['wasted_seconds']:.2f}s compute wasted"
+        )
@@ -3,38 +3,34 @@ from bs4 import BeautifulSoup
 import json
 import os
 from dotenv import load_dotenv
-import traceback
 from googlesearch import search
 from datetime import datetime
 import pytz
 import re
+from debug_log import get_logger
 
 load_dotenv()
+log = get_logger("web")
 
 class WebTools:
     def __init__(self):
-        self.debug = os.getenv('DEBUG_MODE', 'false').lower() == 'true'
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         self.sa_timezone = pytz.timezone('Africa/Johannesburg')
+        # Upper bounds on each request, a turn budget can shorten them further
+        self.search_timeout = float(os.getenv('SEARCH_TIMEOUT', '5'))
+        self.page_timeout = float(os.getenv('PAGE_TIMEOUT', '10'))
 
-    def debug_print(self, *args, **kwargs):
-        if self.debug:
-            print(*args, **kwargs)
-
-    def get_search_urls(self, query: str, num_results: int = 3) -> list:
+    def get_search_urls(self, query: str, num_results: int = 3, timeout: float = None) -> list:
         """Get URLs from Google search"""
         try:
-            self.debug_print(f"\n[DEBUG] Performing Google search for: '{query}'")
-            urls = list(search(query, num_results=num_results))
-            self.debug_print(f"\n[DEBUG] Found {len(urls)} URLs:")
-            for i, url in enumerate(urls, 1):
-                self.debug_print(f"URL {i}: {url}")
+            log.debug("Performing Google search for: '%s'", query)
+            urls = list(search(query, num_results=num_results, timeout=timeout or self.search_timeout))
+            log.debug("Found %d URLs: %s", len(urls), urls)
             return urls
         except Exception as e:
-            self.debug_print(f"\n[DEBUG] Error in Google search: {str(e)}")
-            self.debug_print(traceback.format_exc())
+            log.debug("Error in Google search: %s", e, exc_info=True)
             return []
 
     def clean_text(self, text: str) -> str:
@@ -67,12 +63,12 @@ class WebTools:
                 
         return '\n\n'.join(content)
 
-    def fetch_url_content(self, url: str, index: int) -> dict:
+    def fetch_url_content(self, url: str, index: int, timeout: float = None) -> dict:
         """Fetch and parse content from a URL"""
         try:
-            self.debug_print(f"\n[DEBUG] Fetching content from: {url}")
+            log.debug("Fetching content from: %s", url)
             
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = requests.get(url, headers=self.headers, timeout=timeout or self.page_timeout)
             response.raise_for_status()
             
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -84,8 +80,7 @@ class WebTools:
             content = self.extract_article_content(soup)
             
             if content:
-                self.debug_print(f"[DEBUG] Result {index} processed successfully")
-                self.debug_print(f"[DEBUG] Content length: {len(content)} characters")
+                log.debug("Result %d processed successfully, %d characters", index, len(content))
                 return {
                     "title": title,
                     "url": url,
@@ -94,21 +89,33 @@ class WebTools:
             return None
             
         except Exception as e:
-            self.debug_print(f"\n[DEBUG] Error processing URL {url}: {str(e)}")
+            log.debug("Error processing URL %s: %s", url, e)
             return None
 
-    def search_web(self, query: str, num_results: int = 3) -> str:
-        """Search the web for information"""
+    def search_web(self, query: str, num_results: int = 3, cancel_event=None, budget=None) -> str:
+        """Search the web for information.
+
+        Stops early if cancel_event is set. With a LatencyBudget, each request is
+        limited to the time left and pages that no longer fit are skipped.
+        """
         try:
             # First get the URLs from Google
-            urls = self.get_search_urls(query, num_results)
+            search_timeout = budget.timeout(self.search_timeout) if budget else None
+            urls = self.get_search_urls(query, num_results, timeout=search_timeout)
             if not urls:
                 return "No search results found."
             
             # Then fetch content from each URL
             results = []
             for i, url in enumerate(urls, 1):
-                result = self.fetch_url_content(url, i)
+                if cancel_event is not None and cancel_event.is_set():
+                    log.debug("Search for '%s' cancelled", query)
+                    return "Search cancelled."
+                if budget and budget.expired():
+                    log.debug("Turn budget used up, skipping %d remaining pages", len(urls) - i + 1)
+                    break
+                page_timeout = budget.timeout(self.page_timeout) if budget else None
+                result = self.fetch_url_content(url, i, timeout=page_timeout)
                 if result:
                     results.append(
                         f"Source {i}:\n"
@@ -117,21 +124,24 @@ class WebTools:
                         f"Content:\n{result['content']}\n"
                     )
             
-            combined_results = "\n---\n".join(results) if results else "No useful content found in search results."
-            self.debug_print(f"\n[DEBUG] Total processed results: {len(results)}")
+            if results:
+                combined_results = "\n---\n".join(results)
+            elif budget and budget.expired():
+                combined_results = "The search ran out of time before any pages could be read."
+            else:
+                combined_results = "No useful content found in search results."
+            log.debug("Total processed results: %d", len(results))
             return combined_results
             
         except Exception as e:
             error_msg = f"Error searching web: {str(e)}"
-            self.debug_print(f"\n[DEBUG] {error_msg}")
-            self.debug_print("\n[DEBUG] Full error:")
-            self.debug_print(traceback.format_exc())
+            log.debug(error_msg, exc_info=True)
             return error_msg
 
     def get_sa_time(self) -> str:
         """Get current date and time in South Africa"""
         try:
-            self.debug_print("\n[DEBUG] Getting South African time")
+            log.debug("Getting South African time")
             
             # Get current time in SA timezone
             sa_time = datetime.now(self.sa_timezone)
@@ -139,11 +149,10 @@ class WebTools:
             # Format the time string
             formatted_time = sa_time.strftime("%A, %d %B %Y, %H:%M:%S %Z")
             
-            self.debug_print(f"[DEBUG] Current SA time: {formatted_time}")
+            log.debug("Current SA time: %s", formatted_time)
             return f"Current time in South Africa: {formatted_time}"
             
         except Exception as e:
             error_msg = f"Error getting SA time: {str(e)}"
-            self.debug_print(f"\n[DEBUG] {error_msg}")
-            self.debug_print(traceback.format_exc())
+            log.debug(error_msg, exc_info=True)
             return error_msg
\ No newline at end of file